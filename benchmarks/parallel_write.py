@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Time serial vs. parallel parquet writes of a large frame:
+
+    $ python benchmarks/parallel_write.py [rows] [columns] [workers ...]
+
+pystore must be importable: install it (`pip install -e .`) or run from the
+repository root with `PYTHONPATH=.`.
+"""
+
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pystore import utils
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(rows=4_000_000, columns=8, workers=(2, 4, 8)):
+    index = pd.date_range("2020", periods=rows, freq="s", tz="UTC")
+    data = pd.DataFrame(np.random.randn(rows, columns), index=index)
+    data.columns = data.columns.astype(str)
+    partition_size = data.memory_usage().sum() / 32
+    offsets = utils.row_group_offsets(data, partition_size=partition_size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = utils.make_path(tmp, "data.parquet")
+        serial = timed(
+            lambda: utils.write_parquet(data, path, row_group_offsets=offsets)
+        )
+        print("%d x %d, %d row groups" % (rows, columns, len(offsets)))
+        print("serial              %6.2fs" % serial)
+
+        for processes in (False, True):
+            for n in workers:
+                took = timed(
+                    lambda: utils.write_parquet_parallel(
+                        data, path, offsets, processes=processes, max_workers=n
+                    )
+                )
+                print(
+                    "%-9s x %2d       %6.2fs  (%.2fx)"
+                    % ("processes" if processes else "threads", n, took, serial / took)
+                )
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args[:2], workers=tuple(args[2:]) or (2, 4, 8))
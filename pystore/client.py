@@ -7,12 +7,18 @@ Created on Wed Mar 16 08:59:16 2022
 """
 
 import os
-from typing import Any, Dict, Union
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Union
 
+import numpy as np
 from infinite.agora.pandas import Tensor
 from infinite.agora.time import TIME_RESOLUTION, TS, TimeRange
+from kedro.pipeline import Pipeline
 from kedro.pipeline.node import Node
 
+from . import config, utils
 from .item import Item
 from .store import PyStore
 from .utils import set_path
@@ -23,44 +29,282 @@ class PyStoreClient:
     This client is main entrypoint for writing/reading data.
     """
 
-    def __init__(self, filepath_to_database: str, pystore_name: str, version: str):
+    def __init__(
+        self,
+        filepath_to_database: str,
+        pystore_name: str,
+        version: str,
+        **storage_options,
+    ):
         """
-        Initialize PyStore client with database config.
+        Initialize PyStore client with database config. `filepath_to_database` may be
+        any fsspec URL (e.g. "s3://bucket/pystore"); `storage_options` are passed on
+        to the filesystem.
         """
         filepath_to_database = os.path.expanduser(filepath_to_database)
-        set_path(filepath_to_database)
+        set_path(filepath_to_database, **storage_options)
         self.store = PyStore(pystore_name)
         self.collection = self.store.collection(version)
 
+        # prefetching state, see `prefetch`
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_executor = None
+        self._prefetch_workers = None
+        self._prefetch_queue = deque()
+        self._prefetched = {}
+        self._prefetch_bytes = {}
+        self._prefetch_warmed = set()
+        self._prefetch_budget = 0
+        self._prefetch_generation = 0
+        self._prefetch_scheduling = False
+        self._prefetch_rescan = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Stop prefetching and shut its worker threads down. The client stays usable;
+        a later `prefetch` starts new workers.
+        """
+        with self._prefetch_lock:
+            executor, self._prefetch_executor = self._prefetch_executor, None
+            self._prefetch_workers = None
+            self._prefetch_queue.clear()
+            self._drop_prefetched()
+        if executor is not None:
+            executor.shutdown()
+
     def read(self, name: Union[Node, str]) -> Item:
         """
-        Read data from the pystore database.
+        Read data from the pystore database. Items loaded by `prefetch` are returned
+        with their data already in memory.
         """
         name_to_read = name.name if isinstance(name, Node) else name
+
+        with self._prefetch_lock:
+            future = self._prefetched.pop(name_to_read, None)
+            self._prefetch_bytes.pop(name_to_read, None)
+            if name_to_read in self._prefetch_queue:
+                self._prefetch_queue.remove(name_to_read)
+        if future is not None:
+            self._schedule_prefetch()
+            try:
+                return future.result()
+            except Exception:
+                pass
+
         return self.collection.item(name_to_read)
 
+    def prefetch(
+        self,
+        nodes: Union[Pipeline, Iterable[Union[Node, str]]],
+        memory_budget: float = None,
+        max_workers: int = 4,
+    ):
+        """
+        Load the items the given nodes will read, in execution order, in background
+        threads. A `Pipeline` runs in its topological order; otherwise `nodes` is
+        taken to be the execution order. Each node needs the item named after it
+        (as resolved by `read`) and any of its inputs that are items.
+
+        Loaded items are held until `read` picks them up, within `memory_budget`
+        bytes (defaults to `config.PREFETCH_MEMORY_BUDGET`). Items that don't fit
+        yet have their files pulled into the OS page cache instead, and are loaded
+        as earlier ones are read. Calling `prefetch` again replaces the plan (and
+        the worker pool, if `max_workers` changed). Call `close` when done.
+        """
+        nodes = nodes.nodes if isinstance(nodes, Pipeline) else nodes
+        available = self.collection.list_items_with_data() or set()
+
+        names = []
+        for node in nodes:
+            needed = [node.name, *node.inputs] if isinstance(node, Node) else [node]
+            names.extend(
+                name for name in needed if name in available and name not in names
+            )
+
+        old_executor = None
+        with self._prefetch_lock:
+            if self._prefetch_workers != max_workers:
+                old_executor = self._prefetch_executor
+                self._prefetch_executor = ThreadPoolExecutor(max_workers=max_workers)
+                self._prefetch_workers = max_workers
+            self._prefetch_queue = deque(names)
+            self._prefetch_budget = memory_budget or config.PREFETCH_MEMORY_BUDGET
+            self._drop_prefetched()
+
+        if old_executor is not None:
+            # work already running there finishes; its decisions are discarded
+            old_executor.shutdown(wait=False)
+        self._schedule_prefetch()
+
+    def _drop_prefetched(self):
+        """
+        Forget loaded and in-flight items, invalidating decisions made for them.
+        Called with the prefetch lock held.
+        """
+        for future in self._prefetched.values():
+            future.cancel()
+        self._prefetched.clear()
+        self._prefetch_bytes.clear()
+        self._prefetch_warmed.clear()
+        self._prefetch_generation += 1
+
+    def _schedule_prefetch(self):
+        """
+        Have a worker start loading queued items (see `_run_scheduler`). Never
+        raises: prefetching is best effort, and `read` falls back to a plain read.
+        """
+        with self._prefetch_lock:
+            if self._prefetch_executor is None or not self._prefetch_queue:
+                return
+            if self._prefetch_scheduling:
+                # the running scheduler looks at the budget again before stopping
+                self._prefetch_rescan = True
+                return
+            try:
+                self._prefetch_executor.submit(self._run_scheduler)
+            except RuntimeError:
+                return
+            self._prefetch_scheduling = True
+            self._prefetch_rescan = False
+
+    def _run_scheduler(self):
+        """
+        Start loading queued items while they fit in the memory budget, and warm the
+        page cache for the next one that doesn't. Items that can't be resolved (e.g.
+        deleted since `prefetch`) are dropped from the queue.
+        """
+        try:
+            while self._schedule_next():
+                pass
+        except Exception:
+            with self._prefetch_lock:
+                self._prefetch_scheduling = False
+
+    def _schedule_next(self) -> bool:
+        """
+        Schedule the item at the head of the queue; return whether to carry on.
+        """
+        with self._prefetch_lock:
+            if not self._prefetch_queue:
+                self._prefetch_scheduling = False
+                return False
+            name = self._prefetch_queue[0]
+            generation = self._prefetch_generation
+            self._prefetch_rescan = False
+
+        # file system calls are made without holding the lock
+        try:
+            data_path = self.collection.item(name)._data_path
+            size = utils.path_size(data_path)
+        except Exception:
+            data_path = size = None
+
+        with self._prefetch_lock:
+            if (
+                generation != self._prefetch_generation
+                or not self._prefetch_queue
+                or self._prefetch_queue[0] != name
+            ):
+                # the plan changed meanwhile
+                return True
+
+            if size is None:
+                self._prefetch_queue.popleft()
+                return True
+
+            in_flight = sum(self._prefetch_bytes.values())
+            if in_flight and in_flight + size > self._prefetch_budget:
+                if name not in self._prefetch_warmed:
+                    self._prefetch_warmed.add(name)
+                    self._prefetch_executor.submit(self._warm, data_path)
+                if self._prefetch_rescan:
+                    return True
+                self._prefetch_scheduling = False
+                return False
+
+            self._prefetch_queue.popleft()
+            self._prefetch_bytes[name] = size
+            self._prefetched[name] = self._prefetch_executor.submit(self._load, name)
+            return True
+
+    @staticmethod
+    def _warm(data_path: str):
+        """
+        Pull an item's data file into the OS page cache, if possible.
+        """
+        try:
+            utils.warm_page_cache(data_path)
+        except Exception:
+            pass
+
+    def _load(self, name: str) -> Item:
+        """
+        Read an item with its data, and account for its size in memory.
+        """
+        try:
+            item = self.collection.item(name)
+            size = np.sum(item.data.memory_usage(index=True, deep=True))
+        except Exception:
+            # `read` falls back to a plain read; free the budget for the next item
+            with self._prefetch_lock:
+                self._prefetch_bytes.pop(name, None)
+            self._schedule_prefetch()
+            raise
+
+        with self._prefetch_lock:
+            if name in self._prefetch_bytes:
+                self._prefetch_bytes[name] = size
+        return item
+
     def write(
         self,
         name: str,
         data: Any,
         metadata: Dict[str, Any] = None,
         always_overwrite: bool = False,
+        parallel: bool = False,
+        encode_index: bool = False,
     ):
         """
         General purpose entry point for writing and/or appending data, depending on what is most appropriate.
+        With `parallel=True`, row groups are encoded concurrently, and with
+        `encode_index=True` new items store their index compactly (see `Collection.write`).
         """
         metadata = metadata or {}
 
+        # a prefetched copy of this item would be stale
+        with self._prefetch_lock:
+            self._prefetched.pop(name, None)
+            self._prefetch_bytes.pop(name, None)
+            if name in self._prefetch_queue:
+                self._prefetch_queue.remove(name)
+        # the dropped copy's budget may fit the next queued item
+        self._schedule_prefetch()
+
         if always_overwrite or name not in self.collection.list_items_with_data():
-            self._write(name=name, data=data, metadata=metadata)
+            self._write(
+                name=name,
+                data=data,
+                metadata=metadata,
+                parallel=parallel,
+                encode_index=encode_index,
+            )
         else:
-            self._append(name=name, data=data)
+            self._append(name=name, data=data, parallel=parallel)
 
     def _write(
         self,
         name: str,
         data: Any,
         metadata: Dict[str, Any] = None,
+        parallel: bool = False,
+        encode_index: bool = False,
     ):
         """
         Write data to dataspace. Importantly, "end_timestamp" is added to metadata to enable
@@ -68,12 +312,17 @@ class PyStoreClient:
         """
         metadata = metadata or {}
         metadata["end_timestamp"] = str(self._get_end_timestamp(data))
-        path = self.collection._item_path(name)
-        if not path.exists():
-            path.mkdir()
-        self.collection.write(item=name, data=data, metadata=metadata, overwrite=True)
+        utils.makedirs(self.collection._item_path(name), exist_ok=True)
+        self.collection.write(
+            item=name,
+            data=data,
+            metadata=metadata,
+            overwrite=True,
+            parallel=parallel,
+            encode_index=encode_index,
+        )
 
-    def _append(self, name: str, data: Any):
+    def _append(self, name: str, data: Any, parallel: bool = False):
         """
         Append data to pre-existing data in the database in a way that is idempotent.
         """
@@ -94,6 +343,7 @@ class PyStoreClient:
                 item=name,
                 data=data.pipe(new_time_range.view),
                 metadata=new_metadata,
+                parallel=parallel,
             )
 
     @staticmethod
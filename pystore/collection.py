@@ -23,7 +23,7 @@ from typing import Any, Dict, Union
 import numpy as np
 import pandas as pd
 
-from . import utils
+from . import config, utils
 from .item import Item
 from .utils import make_path
 
@@ -40,11 +40,8 @@ class Collection(object):
         self.datastore = datastore
         self.collection = collection
 
-    def _item_path(self, item, as_string=False):
-        p = utils.make_path(self.datastore, self.collection, item)
-        if as_string:
-            return str(p)
-        return p
+    def _item_path(self, item):
+        return utils.make_path(self.datastore, self.collection, item)
 
     def list_items(self, **kwargs):
         dirs = utils.subdirs(utils.make_path(self.datastore, self.collection))
@@ -76,9 +73,11 @@ class Collection(object):
                 [
                     d
                     for d in dirs
-                    if utils.make_path(
-                        self.datastore, self.collection, d, "metadata.json"
-                    ).exists()
+                    if utils.path_exists(
+                        utils.make_path(
+                            self.datastore, self.collection, d, "metadata.json"
+                        )
+                    )
                 ]
             )
         except FileNotFoundError:
@@ -96,55 +95,164 @@ class Collection(object):
         data: Tensor,
         metadata: dict = None,
         overwrite: bool = False,
+        parallel: bool = False,
+        processes: bool = False,
+        encode_index: bool = False,
     ):
+        """
+        Write data to an item. With `parallel=True`, parquet row groups are encoded
+        and compressed concurrently (in a process pool if `processes=True`, else in a
+        thread pool) and stitched into the item's single data file.
+
+        With `encode_index=True`, a DatetimeIndex is stored as start/frequency when
+        perfectly regular, and as delta-encoded int64 otherwise (see
+        `utils.encode_index`; fastparquet only). Appends keep the item's encoding.
+        """
+        self._write(
+            item, data, metadata, overwrite, parallel, processes, encode_index
+        )
 
+    def _write(
+        self,
+        item,
+        data: Tensor,
+        metadata: dict = None,
+        overwrite: bool = False,
+        parallel: bool = False,
+        processes: bool = False,
+        encode_index: bool = False,
+        first_row: int = 0,
+    ):
+        """
+        Write data to an item, bumping its version. `first_row` is the first row that
+        is new in this version (0 for a full write, the previous length for an append).
+        """
         metadata = metadata or {}
         metadata["file_type"] = self._infer_file_type_from_data(data)
+        metadata.pop("_index", None)
+        metadata.pop("_row_group_offsets", None)
+        if metadata.pop("_index_encoding", None) is not None:
+            encode_index = True
 
         path = self._item_path(item)
-        if path.exists() and not overwrite:
+        if utils.path_exists(path) and not overwrite:
             raise ValueError(
                 """
                 Item already exists. To overwrite, use `overwrite=True`.
                 Otherwise, use `<collection>.append()`"""
             )
 
+        previous = utils.read_metadata(path, cache=False) or {}
+        metadata["_version"] = previous.get("_version", 0) + 1
+        manifest = previous.get("_manifest", []) if first_row else []
+        metadata["_manifest"] = self._trim_manifest(
+            manifest + [[metadata["_version"], first_row]]
+        )
+
         data_path = make_path(item, "data." + metadata["file_type"])
-        data_path = self._item_path(data_path, as_string=True)
+        data_path = self._item_path(data_path)
+        encoding = None
         if metadata["file_type"] == "parquet":
-            data.to_parquet(data_path, compression="snappy", engine=self.engine)
+            offsets = utils.row_group_offsets(data)
+            index = utils.sparse_index(data, offsets)
+            metadata["_row_group_offsets"] = offsets
+            if index is not None:
+                metadata["_index"] = index
+            if encode_index:
+                data, encoding = utils.encode_index(data, offsets)
+            if parallel:
+                utils.write_parquet_parallel(
+                    data,
+                    data_path,
+                    offsets,
+                    engine=self.engine,
+                    processes=processes,
+                    index_encoding=encoding,
+                    version=metadata["_version"],
+                )
+            else:
+                utils.write_parquet(
+                    data,
+                    data_path,
+                    engine=self.engine,
+                    row_group_offsets=offsets,
+                    index_encoding=encoding,
+                    version=metadata["_version"],
+                )
         elif metadata["file_type"] == "pickle":
-            pd.to_pickle(data, data_path)
+            if encode_index:
+                data, encoding = utils.encode_index(data, [0])
+            utils.write_pickle(
+                data,
+                data_path,
+                index_encoding=encoding,
+                version=metadata["_version"],
+            )
+
+        if encoding is not None:
+            # the encoding itself lives in the data file; this only marks the
+            # item so that appends keep encoding its index
+            metadata["_index_encoding"] = encoding["kind"]
 
         metadata_path = make_path(item, "metadata.json")
         utils.write_metadata(
             utils.make_path(self.datastore, self.collection, metadata_path), metadata
         )
 
-    def append(self, item: str, data: Tensor, metadata: Dict[str, Any] = None):
+        # e.g. numeric items pickled before parquet was inferred for them
+        previous_type = previous.get("file_type", metadata["file_type"])
+        if previous_type != metadata["file_type"]:
+            stale_path = self._item_path(make_path(item, "data." + previous_type))
+            if utils.path_exists(stale_path):
+                utils.remove_path(stale_path)
+
+    def append(
+        self,
+        item: str,
+        data: Tensor,
+        metadata: Dict[str, Any] = None,
+        parallel: bool = False,
+    ):
         """
         Append data to existing data.
         """
         metadata = metadata or {}
         existing_item = self.item(item)
-        self.write(
+        self._write(
             item=item,
-            data=existing_item.data.append(data),
+            data=pd.concat([existing_item.data, data]),
             metadata={**existing_item.metadata, **metadata},
             overwrite=True,
+            parallel=parallel,
+            first_row=len(existing_item.data),
         )
 
+    @staticmethod
+    def _trim_manifest(manifest):
+        """
+        Keep the manifest to `config.MANIFEST_LENGTH` entries by folding the oldest
+        ones together. The folded entry starts at the earliest of their rows, so
+        `Item.tail` may return a few extra rows for very old versions, but never
+        misses any.
+        """
+        if len(manifest) <= config.MANIFEST_LENGTH:
+            return manifest
+
+        split = len(manifest) - config.MANIFEST_LENGTH + 1
+        folded, kept = manifest[:split], manifest[split:]
+        return [[folded[-1][0], min(first_row for _, first_row in folded)]] + kept
+
     @staticmethod
     def _infer_file_type_from_data(df: Tensor) -> str:
         """
         Infer the correct file type, given the data itself. The general goal is to read/write using parquet, unless
-        known problems exist.
+        known problems exist: Series, MultiIndex frames and non-numeric columns are pickled.
         """
         if isinstance(df, pd.Series):
             return "pickle"
         elif df.index.nlevels > 1:
             return "pickle"
-        elif any([type(t) not in Numeric for t in df.dtypes]):
+        elif any([t not in Numeric for t in df.dtypes]):
             return "pickle"
         else:
             return "parquet"
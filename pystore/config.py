@@ -25,6 +25,15 @@ from .utils import Path
 DEFAULT_PATH = os.environ.get("PYSTORE_PATH", Path.home() / "pystore")
 DEFAULT_PARTITION_SIZE = 99e6  # ~99MB
 PARTITION_SIZE = 99e6  # ~99MB
+ROW_GROUP_CACHE_SIZE = 8  # decoded row groups kept per item
+MANIFEST_LENGTH = 1000  # append history kept in item metadata
+STALE_READ_TIMEOUT = 5  # seconds to wait for metadata to catch up with a write
+PREFETCH_MEMORY_BUDGET = 2e9  # ~2GB
+
+# fsspec storage
+STORAGE_OPTIONS = {}
+METADATA_CACHE_TTL = 0  # seconds; 0 disables the metadata cache
+_METADATA_CACHE = {}
 
 # dask distributed
 _SCHEDULER = None
@@ -4,12 +4,16 @@
 PyStore: Flat-file datastore for timeseries data
 """
 
+import asyncio
+import time
+from collections import OrderedDict
 from functools import cached_property
-from typing import Union
+from typing import AsyncIterator, Iterator, List, Union
 
+import numpy as np
 import pandas as pd
 
-from . import utils
+from . import config, utils
 
 Tensor = Union[pd.Series, pd.DataFrame]
 
@@ -48,26 +52,272 @@ class Item(object):
 
         self._metadata_path = utils.make_path(datastore, collection, item)
 
-        if not self._metadata_path.exists():
+        if not utils.path_exists(self._metadata_path):
             raise ValueError(
                 "Item `%s` doesn't exist. "
                 "Create it using collection.write(`%s`, data, ...)" % (item, item)
             )
 
-        self.metadata = utils.read_metadata(self._metadata_path)
+        self._reload()
+
+    def _reload(self):
+        """
+        (Re)read the item's metadata, dropping anything decoded under the old one.
+        """
+        metadata = utils.read_metadata(self._metadata_path, cache=False)
+        if metadata is None:
+            raise ValueError("Item `%s` doesn't exist." % self.item)
+
+        self.metadata = metadata
         self.file_type = self.metadata["file_type"]
         self._data_path = utils.make_path(
-            datastore, collection, item, "data." + self.file_type
+            self.datastore, self.collection, self.item, "data." + self.file_type
         )
+        self._row_groups = OrderedDict()
+        self.__dict__.pop("data", None)
+        self.__dict__.pop("_row_group_starts", None)
+
+    def _fresh(self, read, *args):
+        """
+        Return `read(*args)`, reloading the item and retrying whenever the data file
+        turns out to hold another version than the metadata (e.g. after an overwrite,
+        or while a write's metadata hasn't landed yet).
+        """
+        deadline = time.monotonic() + config.STALE_READ_TIMEOUT
+        while True:
+            version = self.version
+            try:
+                result = read(*args)
+            except utils.StaleVersionError:
+                self._reload()
+                if self.version == version:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.01)
+                continue
+
+            # a nested read may have reloaded the item under us
+            if self.version == version:
+                return result
 
     @cached_property
     def data(self) -> Tensor:
         """
         Return the data from the database.
         """
+        return self._fresh(self._read_data)
+
+    def _read_data(self) -> Tensor:
+        """
+        Read the whole data file.
+        """
         if self.file_type == "parquet":
-            return pd.read_parquet(self._data_path, engine="fastparquet")
+            return utils.read_parquet(self._data_path, version=self.version)
         elif self.file_type == "pickle":
-            return pd.read_pickle(self._data_path)
+            return utils.read_pickle(self._data_path, version=self.version)
         else:
             ValueError("The file type could not be inferred from the metadata.")
+
+    @property
+    def version(self) -> int:
+        """
+        The item's version, bumped by every write and append.
+        """
+        return self.metadata.get("_version", 0)
+
+    def tail(self, since: int = None) -> Tensor:
+        """
+        Return the rows written or appended after version `since` (all rows if
+        `since` is None). Only the trailing row groups holding them are decoded.
+        """
+        if since is None:
+            return self.data
+        return self._fresh(self._tail_rows, since)
+
+    def _tail_rows(self, since: int) -> Tensor:
+        """
+        Read the rows added after version `since`, per the item's manifest.
+        """
+        manifest = self.metadata.get("_manifest", [[self.version, 0]])
+        new_rows = [first_row for version, first_row in manifest if version > since]
+        if not new_rows:
+            return self._read_rows(None)
+        return self._read_rows(min(new_rows))
+
+    def subscribe(self, since: int = None, interval: float = 1.0) -> Iterator[Tensor]:
+        """
+        Yield newly written/appended rows as they land, polling the item's metadata
+        every `interval` seconds. Starts after the current version unless `since`
+        is given.
+        """
+        version = self.version if since is None else since
+        while True:
+            rows, version = self._poll(version)
+            if rows is None:
+                time.sleep(interval)
+            else:
+                yield rows
+
+    async def asubscribe(
+        self, since: int = None, interval: float = 1.0
+    ) -> AsyncIterator[Tensor]:
+        """
+        Async version of `subscribe`; reads run in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        version = self.version if since is None else since
+        while True:
+            rows, version = await loop.run_in_executor(None, self._poll, version)
+            if rows is None:
+                await asyncio.sleep(interval)
+            else:
+                yield rows
+
+    def _poll(self, version: int):
+        """
+        Return the rows added after `version` and the latest version, or
+        (None, version) if nothing changed. Reads that overlap a write are retried,
+        and `tail` only returns rows read from the data file of the version it
+        reports (see `_fresh`).
+        """
+        while True:
+            current = self._latest_version()
+            if current is None or current == version:
+                return None, version
+
+            try:
+                latest = Item(self.item, self.datastore, self.collection)
+                rows = latest.tail(since=version)
+            except Exception:
+                # the item was being rewritten under us (e.g. a partial data file)
+                if self._latest_version() == current:
+                    raise
+                continue
+
+            if self._latest_version() == latest.version:
+                return rows, latest.version
+
+    def _latest_version(self) -> int:
+        """
+        The item's version on disk (None if its metadata is missing).
+        """
+        metadata = utils.read_metadata(self._metadata_path, cache=False)
+        return None if metadata is None else metadata.get("_version", 0)
+
+    def _read_rows(self, start: int = None) -> Tensor:
+        """
+        Return the rows from position `start` onwards (none if `start` is None),
+        decoding only the row groups that hold them.
+        """
+        offsets = self.metadata.get("_row_group_offsets")
+        if "data" in self.__dict__ or self.file_type != "parquet" or not offsets:
+            return self.data.iloc[start:] if start is not None else self.data.iloc[:0]
+
+        if start is None:
+            first = len(offsets) - 1
+        else:
+            first = max(int(np.searchsorted(offsets, start, side="right")) - 1, 0)
+
+        data = utils.read_parquet(
+            self._data_path,
+            row_groups=list(range(first, len(offsets))),
+            version=self.version,
+        )
+        if start is None:
+            return data.iloc[:0]
+        return data.iloc[start - offsets[first] :]
+
+    def asof(self, ts, columns: List[str] = None):
+        """
+        Return the last row at or before `ts` (NaN if `ts` precedes the data).
+        Unlike `pandas.DataFrame.asof`, rows containing NaN are returned as stored.
+        Naive timestamps are taken to be in the timezone of the item's index.
+        """
+        return self.asof_many([ts], columns=columns).iloc[0]
+
+    def asof_many(self, timestamps, columns: List[str] = None) -> Tensor:
+        """
+        Vectorized `asof`: return the last row at or before each of `timestamps`,
+        indexed by `timestamps`. Only the row groups containing the answers are
+        decoded, using the sparse index of row group start timestamps.
+        """
+        return self._fresh(self._asof_many, timestamps, columns)
+
+    def _asof_many(self, timestamps, columns: List[str] = None) -> Tensor:
+        """
+        `asof_many` against the item's current metadata.
+        """
+        starts = self._row_group_starts
+        where = pd.DatetimeIndex(timestamps)
+
+        if "data" in self.__dict__ or starts is None:
+            data = self.data if columns is None else self.data[columns]
+        else:
+            groups = starts.searchsorted(self._localize(where, starts.tz), "right") - 1
+            groups = np.unique(groups[groups >= 0])
+            data = self._read_row_groups(groups if len(groups) else [0], columns)
+            if not len(groups):
+                data = data.iloc[:0]
+
+        where = self._localize(where, getattr(data.index, "tz", None))
+        return self._asof_rows(data, where)
+
+    @cached_property
+    def _row_group_starts(self) -> pd.DatetimeIndex:
+        """
+        The first timestamp of each row group, as recorded on write.
+        """
+        index = self.metadata.get("_index")
+        if self.file_type != "parquet" or index is None:
+            return None
+
+        return utils.from_epoch_ns(index["row_group_starts"], index["tz"])
+
+    def _read_row_groups(self, groups, columns: List[str] = None) -> pd.DataFrame:
+        """
+        Decode (and cache) the given row groups.
+        """
+        frames = []
+        for group in groups:
+            key = (int(group), None if columns is None else tuple(columns))
+            if key in self._row_groups:
+                self._row_groups.move_to_end(key)
+            else:
+                data = utils.read_parquet(
+                    self._data_path,
+                    columns=columns,
+                    row_groups=[key[0]],
+                    version=self.version,
+                )
+                self._row_groups[key] = data
+                if len(self._row_groups) > config.ROW_GROUP_CACHE_SIZE:
+                    self._row_groups.popitem(last=False)
+            frames.append(self._row_groups[key])
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+    @staticmethod
+    def _localize(where: pd.DatetimeIndex, tz) -> pd.DatetimeIndex:
+        """
+        Align the timezone of the lookup timestamps with the item's index.
+        """
+        if tz is None:
+            return where if where.tz is None else where.tz_convert(None)
+        if where.tz is None:
+            return where.tz_localize(tz)
+        return where.tz_convert(tz)
+
+    @staticmethod
+    def _asof_rows(data: Tensor, where: pd.DatetimeIndex) -> Tensor:
+        """
+        Pick the last row at or before each timestamp in `where`.
+        """
+        positions = data.index.searchsorted(where, side="right") - 1
+        missing = positions < 0
+
+        rows = data.iloc[np.maximum(positions, 0)] if len(data) else data.reindex(where)
+        rows.index = where
+        if missing.any() and len(data):
+            if rows.ndim == 2:
+                missing = np.broadcast_to(missing[:, None], rows.shape)
+            rows = rows.mask(missing)
+        return rows
@@ -18,9 +18,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os
-import shutil
-
 from . import utils
 from .collection import Collection
 
@@ -47,13 +44,13 @@ class PyStore(object):
 
         datastore_path = utils.get_path()
         if not utils.path_exists(datastore_path):
-            os.makedirs(datastore_path)
+            utils.makedirs(datastore_path)
 
         self.datastore = utils.make_path(datastore_path, datastore)
 
         # Create PyStore metadata, if it doesn't exist
         if not utils.path_exists(self.datastore):
-            os.makedirs(self.datastore)
+            utils.makedirs(self.datastore)
             utils.write_metadata(
                 utils.make_path(self.datastore, "metadata.json"),
                 {"engine": "fastparquet"},
@@ -80,8 +77,8 @@ class PyStore(object):
                     "Collection exists! To overwrite, use `overwrite=True`"
                 )
 
-        os.makedirs(collection_path)
-        os.makedirs(utils.make_path(collection_path, "_snapshots"))
+        utils.makedirs(collection_path)
+        utils.makedirs(utils.make_path(collection_path, "_snapshots"))
 
         self.collections = self.list_collections()
         return Collection(collection, self.datastore)
@@ -90,7 +87,7 @@ class PyStore(object):
         """
         Delete a collection and all of its items.
         """
-        shutil.rmtree(utils.make_path(self.datastore, collection))
+        utils.remove_path(utils.make_path(self.datastore, collection))
 
         self.collections = self.list_collections()
         return True
@@ -18,15 +18,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import json
 import os
-import shutil
+import posixpath
+import struct
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
+import fastparquet
+import fastparquet.writer
+import fsspec
+import fsspec.implementations.local
+import fsspec.parquet
 import numpy as np
 import pandas as pd
 from dask import dataframe as dd
 from dask.distributed import Client
+from fastparquet.cencoding import from_buffer
 
 try:
     from pathlib import Path
@@ -37,6 +49,13 @@ except (ImportError, AttributeError):
 
 from . import config
 
+INDEX_ENCODING_KEY = "pystore_index_encoding"
+VERSION_KEY = "pystore_version"
+
+
+class StaleVersionError(ValueError):
+    """a data file holds another version than the metadata it was read with"""
+
 
 def read_csv(urlpath, *args, **kwargs):
     def rename_dask_index(df, name):
@@ -68,91 +87,513 @@ def read_csv(urlpath, *args, **kwargs):
 
 
 def datetime_to_int64(df):
-    """convert datetime index to epoch int
+    """convert datetime index to epoch int (nanoseconds, UTC)
     allows for cross language/platform portability
     """
 
-    if isinstance(df.index, dd.Index) and (
-        isinstance(df.index, pd.DatetimeIndex) and any(df.index.nanosecond) > 0
-    ):
-        df.index = df.index.astype(np.int64)  # / 1e9
+    if isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.Index(epoch_ns(df.index), name=df.index.name)
 
     return df
 
 
+def epoch_ns(index):
+    """epoch nanoseconds (UTC) of a DatetimeIndex, whatever its unit"""
+    return index.values.astype("datetime64[ns]").view(np.int64)
+
+
+def from_epoch_ns(values, tz=None, name=None):
+    """DatetimeIndex from epoch nanoseconds (UTC), localized to `tz`"""
+    values = np.asarray(values, dtype=np.int64).view("datetime64[ns]")
+    index = pd.DatetimeIndex(values, name=name)
+    if tz is not None:
+        index = index.tz_localize("UTC").tz_convert(tz)
+    return index
+
+
+def encode_index(data, offsets):
+    """
+    encode a DatetimeIndex compactly: perfectly regular indexes are reduced to
+    start/frequency (the data gets a RangeIndex), anything else to int64 deltas
+    that restart at each row group offset so row groups decode independently.
+    returns the encoded data and the encoding (None if there's nothing to encode),
+    which the writers store inside the data file so the two can't diverge
+    """
+    index = data.index
+    if not isinstance(index, pd.DatetimeIndex):
+        return data, None
+
+    encoded = datetime_to_int64(data.copy(deep=False))
+    values = np.asarray(encoded.index, dtype=np.int64)
+    deltas = np.diff(values, prepend=0)
+    encoding = {
+        "tz": None if index.tz is None else str(index.tz),
+        "unit": getattr(index, "unit", "ns"),
+        "name": index.name,
+    }
+
+    if len(values) < 2 or (deltas[1:] == deltas[1]).all():
+        encoding["kind"] = "regular"
+        encoding["start"] = int(values[0]) if len(values) else 0
+        encoding["step"] = int(deltas[1]) if len(values) > 1 else 0
+        encoding["freq"] = index.freqstr
+        encoded.index = pd.RangeIndex(len(values))
+    else:
+        encoding["kind"] = "delta"
+        deltas[offsets] = values[offsets]
+        encoded.index = pd.Index(deltas, name=index.name)
+
+    return encoded, encoding
+
+
+def decode_index(data, encoding, row_groups=None):
+    """
+    restore the DatetimeIndex of `data` from its `encode_index` encoding.
+    `row_groups` lists the (first row, row count) of each row group that makes
+    up `data`, in order (defaults to a single group holding every row)
+    """
+    if encoding is None:
+        return data
+
+    row_groups = row_groups or [(0, len(data))]
+    if not len(data):
+        values = np.array([], dtype=np.int64)
+    elif encoding["kind"] == "regular":
+        rows = np.concatenate(
+            [np.arange(first, first + count) for first, count in row_groups]
+        ).astype(np.int64)
+        values = encoding["start"] + encoding["step"] * rows
+    else:
+        deltas = np.asarray(data.index, dtype=np.int64)
+        bounds = np.cumsum([count for _, count in row_groups])[:-1]
+        values = np.concatenate([np.cumsum(part) for part in np.split(deltas, bounds)])
+
+    index = from_epoch_ns(values, encoding["tz"], encoding["name"])
+    if hasattr(index, "as_unit"):
+        index = index.as_unit(encoding["unit"])
+
+    contiguous = all(
+        first == prev_first + prev_count
+        for (prev_first, prev_count), (first, _) in zip(row_groups, row_groups[1:])
+    )
+    if encoding.get("freq") and contiguous:
+        index = pd.DatetimeIndex(index, freq=encoding["freq"])
+
+    data.index = index
+    return data
+
+
+def get_filesystem(path):
+    """return the fsspec filesystem and protocol-less path for `path`"""
+    return fsspec.core.url_to_fs(str(path), **config.STORAGE_OPTIONS)
+
+
 def subdirs(d):
-    """use this to construct paths for future storage support"""
+    """names of the directories in `d`, other than _snapshots"""
+    fs, path = get_filesystem(d)
     return [
-        o.parts[-1]
-        for o in Path(d).iterdir()
-        if o.is_dir() and o.parts[-1] != "_snapshots"
+        o["name"].rstrip("/").split("/")[-1]
+        for o in fs.ls(path, detail=True)
+        if o["type"] == "directory"
+        and o["name"].rstrip("/").split("/")[-1] != "_snapshots"
     ]
 
 
 def path_exists(path):
-    """use this to construct paths for future storage support"""
-    return path.exists()
+    """whether `path` exists on its filesystem"""
+    fs, path = get_filesystem(path)
+    return fs.exists(path)
+
+
+def path_size(path):
+    """size of the file at `path`, in bytes"""
+    fs, path = get_filesystem(path)
+    return fs.size(path)
+
+
+def warm_page_cache(path):
+    """
+    ask the OS to read a local file into its page cache ahead of use
+    (a no-op on remote filesystems)
+    """
+    fs, path = get_filesystem(path)
+    if not isinstance(fs, fsspec.implementations.local.LocalFileSystem):
+        return False
+
+    with open(path, "rb") as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while f.read(1 << 24):
+                pass
+    return True
+
+
+def makedirs(path, exist_ok=False):
+    """create the directory `path` and any missing parents"""
+    fs, path = get_filesystem(path)
+    fs.makedirs(path, exist_ok=exist_ok)
+
+
+def remove_path(path):
+    """delete `path` recursively and drop its cached metadata"""
+    fs, fs_path = get_filesystem(path)
+    fs.rm(fs_path, recursive=True)
+    clear_metadata_cache(path)
+
+
+def open_file(path, mode="rb"):
+    """open `path` on its filesystem, creating parent dirs when writing"""
+    fs, path = get_filesystem(path)
+    if "w" in mode:
+        fs.makedirs(posixpath.dirname(path), exist_ok=True)
+    return fs.open(path, mode)
 
 
-def read_metadata(path):
-    """use this to construct paths for future storage support"""
+@contextmanager
+def open_replacement(path):
+    """
+    open a temporary file next to `path` for writing, and move it over `path`
+    once written, so readers never see a partly written file
+    """
+    fs, fs_path = get_filesystem(path)
+    fs.makedirs(posixpath.dirname(fs_path), exist_ok=True)
+    tmp_path = "%s.%s.tmp" % (fs_path, uuid.uuid4().hex)
+    try:
+        with fs.open(tmp_path, "wb") as f:
+            yield f
+        fs.mv(tmp_path, fs_path)
+    except BaseException:
+        if fs.exists(tmp_path):
+            fs.rm(tmp_path)
+        raise
+
+
+def read_metadata(path, cache=True):
+    """
+    read the metadata.json under `path`. with `cache=True`, an entry read within the
+    last `config.METADATA_CACHE_TTL` seconds is reused; the TTL is 0 (no caching) by
+    default, since writes from other processes don't invalidate the cache
+    """
     dest = make_path(path, "metadata.json")
-    if path_exists(dest):
-        with dest.open() as f:
-            return json.load(f)
 
+    cached = config._METADATA_CACHE.get(dest)
+    if cache and cached is not None:
+        cached_at, raw = cached
+        if time.monotonic() - cached_at < config.METADATA_CACHE_TTL:
+            return json.loads(raw)
+
+    fs, fs_path = get_filesystem(dest)
+    try:
+        raw = fs.cat_file(fs_path)
+    except FileNotFoundError:
+        config._METADATA_CACHE.pop(dest, None)
+        return None
 
-def write_metadata(path: Path, metadata: dict = None):
-    """use this to construct paths for future storage support"""
+    _cache_metadata(dest, raw)
+    return json.loads(raw)
+
+
+def write_metadata(path: str, metadata: dict = None):
+    """write `metadata` (stamped with `_updated`) as json to `path`"""
     metadata = metadata or {}
     now = datetime.now()
     metadata["_updated"] = now.strftime("%Y-%m-%d %H:%I:%S.%f")
-    with path.open(mode="w") as f:
-        json.dump(metadata, f, ensure_ascii=False)
+    raw = json.dumps(metadata, ensure_ascii=False).encode("utf-8")
+    with open_replacement(path) as f:
+        f.write(raw)
+    _cache_metadata(make_path(path), raw)
+
+
+def _cache_metadata(path, raw):
+    """remember raw metadata for `read_metadata`, if caching is enabled"""
+    if config.METADATA_CACHE_TTL > 0:
+        config._METADATA_CACHE[path] = (time.monotonic(), raw)
+    else:
+        config._METADATA_CACHE.pop(path, None)
+
+
+def clear_metadata_cache(path=None):
+    """drop cached metadata for `path` and everything below it (or all of it)"""
+    if path is None:
+        config._METADATA_CACHE.clear()
+        return
+
+    prefix = make_path(path)
+    for key in list(config._METADATA_CACHE):
+        if key == prefix or key.startswith(prefix + "/"):
+            del config._METADATA_CACHE[key]
+
+
+def read_parquet(path, columns=None, row_groups=None, version=None):
+    """
+    read a parquet file, fetching the footer and the byte ranges of the
+    required row groups/columns up front (concurrently on async filesystems),
+    and restoring an encoded index. raises StaleVersionError if the file is
+    stamped with another item version than `version`
+    """
+    fs, fs_path = get_filesystem(path)
+    with fsspec.parquet.open_parquet_file(
+        fs_path, fs=fs, columns=columns, row_groups=row_groups, engine="fastparquet"
+    ) as f:
+        pf = fastparquet.ParquetFile(f)
+        _check_version(path, pf.key_value_metadata.get(VERSION_KEY), version)
+        if row_groups is None:
+            row_groups = range(len(pf.row_groups))
+            data = pf.to_pandas(columns=columns)
+        else:
+            data = pd.concat([pf[i].to_pandas(columns=columns) for i in row_groups])
+
+    encoding = pf.key_value_metadata.get(INDEX_ENCODING_KEY)
+    if encoding is None:
+        return data
+
+    counts = [row_group.num_rows for row_group in pf.row_groups]
+    firsts = np.cumsum([0] + counts)
+    return decode_index(
+        data, json.loads(encoding), [(firsts[i], counts[i]) for i in row_groups]
+    )
+
+
+def write_parquet(
+    data,
+    path,
+    engine="fastparquet",
+    row_group_offsets=None,
+    index_encoding=None,
+    version=None,
+):
+    """write `data` as snappy parquet to `path`, split at `row_group_offsets`"""
+    kwargs = _footer_kwargs(engine, index_encoding, version)
+    if row_group_offsets is not None:
+        if engine == "fastparquet":
+            kwargs["row_group_offsets"] = list(row_group_offsets)
+        elif len(row_group_offsets) > 1:
+            kwargs["row_group_size"] = row_group_offsets[1] - row_group_offsets[0]
+
+    with open_replacement(path) as f:
+        data.to_parquet(f, compression="snappy", engine=engine, **kwargs)
+
+
+def _footer_kwargs(engine, index_encoding=None, version=None):
+    """
+    `to_parquet` arguments storing an `encode_index` encoding and the item
+    version in the footer (the version is only stamped by fastparquet)
+    """
+    if index_encoding is not None and engine != "fastparquet":
+        raise ValueError("Index encoding requires the fastparquet engine")
+    if engine != "fastparquet":
+        return {}
+
+    custom_metadata = {}
+    if index_encoding is not None:
+        custom_metadata[INDEX_ENCODING_KEY] = json.dumps(index_encoding)
+    if version is not None:
+        custom_metadata[VERSION_KEY] = str(version)
+    return {"custom_metadata": custom_metadata} if custom_metadata else {}
+
+
+def _check_version(path, stamped, version):
+    """raise StaleVersionError if `path` is stamped with another version"""
+    if version is not None and stamped is not None and int(stamped) != version:
+        raise StaleVersionError(
+            "`%s` holds version %s, not %s" % (path, stamped, version)
+        )
+
+
+def write_parquet_parallel(
+    data,
+    path,
+    row_group_offsets,
+    engine="fastparquet",
+    processes=False,
+    max_workers=None,
+    index_encoding=None,
+    version=None,
+):
+    """
+    encode and compress each row group of `data` concurrently (in a thread or
+    process pool of `max_workers`, default one per core), then stitch the row
+    groups into a single parquet file
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    default_index = data.index.equals(pd.RangeIndex(len(data)))
+    if (
+        engine != "fastparquet"
+        or max_workers < 2
+        or len(row_group_offsets) < 2
+        or (isinstance(data.index, pd.RangeIndex) and not default_index)
+    ):
+        # footers are merged with fastparquet, a pool can't beat a single core,
+        # and a range index's pandas metadata describes a single range
+        return write_parquet(
+            data, path, engine, row_group_offsets, index_encoding, version
+        )
+
+    # a default range index is what readers return when there's no index at all
+    index = False if default_index else None
+
+    bounds = list(row_group_offsets) + [len(data)]
+    chunks = [data.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    count = len(chunks)
+    kwargs = [_footer_kwargs(engine, index_encoding, version)] * count
+
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=max_workers) as executor, open_replacement(path) as f:
+        f.write(b"PAR1")
+        position = 4
+        fmd, row_groups = None, []
+
+        for part in executor.map(
+            _encode_parquet, chunks, [engine] * count, [index] * count, kwargs
+        ):
+            part = memoryview(part)
+            footer_size = struct.unpack("<I", part[-8:-4])[0]
+            footer_start = len(part) - 8 - footer_size
+            part_fmd = from_buffer(bytes(part[footer_start:-8]), "FileMetaData")
+            for row_group in part_fmd.row_groups:
+                _shift_row_group(row_group, position - 4)
+                row_groups.append(row_group)
+            if fmd is None:
+                fmd = part_fmd
+
+            f.write(part[4:footer_start])
+            position += footer_start - 4
+
+        fmd.row_groups = row_groups
+        fmd.num_rows = sum(row_group.num_rows for row_group in row_groups)
+        footer_size = fastparquet.writer.write_thrift(f, fmd)
+        f.write(struct.pack("<I", footer_size))
+        f.write(b"PAR1")
+
+
+def _encode_parquet(data, engine, index=None, kwargs=None):
+    """encode `data` as a standalone parquet file"""
+    buf = io.BytesIO()
+    data.to_parquet(
+        buf, compression="snappy", engine=engine, index=index, **(kwargs or {})
+    )
+    return buf.getvalue()
+
+
+def _shift_row_group(row_group, shift):
+    """move the byte offsets of a row group's column chunks by `shift`"""
+    if row_group.file_offset is not None:
+        row_group.file_offset += shift
+
+    for column in row_group.columns:
+        column.file_offset += shift
+        meta = column.meta_data
+        for field in (
+            "data_page_offset",
+            "dictionary_page_offset",
+            "index_page_offset",
+            "bloom_filter_offset",
+        ):
+            if getattr(meta, field) is not None:
+                setattr(meta, field, getattr(meta, field) + shift)
+
+        # page indexes hold absolute offsets of their own; don't carry them over
+        column.column_index_offset = column.column_index_length = None
+        column.offset_index_offset = column.offset_index_length = None
+
+
+def row_group_offsets(data, partition_size=None):
+    """
+    split `data` into row groups of roughly `partition_size` bytes
+    (defaults to `config.PARTITION_SIZE`), returning the starting row of each
+    """
+    partition_size = partition_size or config.PARTITION_SIZE
+    nrows = len(data)
+    if nrows == 0:
+        return [0]
+
+    row_bytes = data.memory_usage(index=True, deep=True)
+    row_bytes = np.sum(row_bytes) / nrows
+    rows_per_group = max(1, int(partition_size // max(row_bytes, 1)))
+    return list(range(0, nrows, rows_per_group))
+
+
+def sparse_index(data, offsets):
+    """
+    the first timestamp of each row group (plus the index timezone),
+    or None if `data` doesn't have a sorted, non-empty DatetimeIndex
+    """
+    index = data.index
+    if not isinstance(index, pd.DatetimeIndex) or not index.is_monotonic_increasing:
+        return None
+    if not len(index):
+        return None
+
+    return {
+        "tz": None if index.tz is None else str(index.tz),
+        "row_group_starts": epoch_ns(index[offsets]).tolist(),
+    }
+
+
+def read_pickle(path, version=None):
+    """
+    read a pickled pandas object from `path`, restoring an encoded index.
+    raises StaleVersionError if it's stamped with another version than `version`
+    """
+    with open_file(path, "rb") as f:
+        data = pd.read_pickle(f)
+    _check_version(path, data.attrs.pop(VERSION_KEY, None), version)
+    return decode_index(data, data.attrs.pop(INDEX_ENCODING_KEY, None))
+
+
+def write_pickle(data, path, index_encoding=None, version=None):
+    """pickle a pandas object to `path`, with its index encoding and version"""
+    stamps = {INDEX_ENCODING_KEY: index_encoding, VERSION_KEY: version}
+    stamps = {key: value for key, value in stamps.items() if value is not None}
+    if stamps:
+        data = data.copy(deep=False)
+        data.attrs = {**data.attrs, **stamps}
+    with open_replacement(path) as f:
+        pd.to_pickle(data, f)
 
 
 def make_path(*args):
-    """use this to construct paths for future storage support"""
-    return Path(*args)
+    """join path components (posix separators, fsspec urls allowed)"""
+    return posixpath.join(*[str(arg) for arg in args])
 
 
 def get_path(*args):
-    """use this to construct paths for future storage support"""
-    return Path(config.DEFAULT_PATH, *args)
+    """path under the datastore root (`config.DEFAULT_PATH`)"""
+    return make_path(config.DEFAULT_PATH, *args)
 
 
-def set_path(path):
+def set_path(path, **storage_options):
     if path is None:
         path = get_path()
 
     else:
-        path = path.rstrip("/").rstrip("\\").rstrip(" ")
-        if "://" in path and "file://" not in path:
-            raise ValueError("PyStore currently only works with local file system")
+        path = str(path).rstrip("/").rstrip("\\").rstrip(" ")
 
     config.DEFAULT_PATH = path
-    path = get_path()
+    config.STORAGE_OPTIONS = storage_options
+    clear_metadata_cache()
 
     # if path does not exist - create it
     if not path_exists(get_path()):
-        os.makedirs(get_path())
+        makedirs(get_path())
 
     return get_path()
 
 
 def list_stores():
     if not path_exists(get_path()):
-        os.makedirs(get_path())
+        makedirs(get_path())
     return subdirs(get_path())
 
 
 def delete_store(store):
-    shutil.rmtree(get_path(store))
+    remove_path(get_path(store))
     return True
 
 
 def delete_stores():
-    shutil.rmtree(get_path())
+    remove_path(get_path())
     return True
 
 
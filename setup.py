@@ -61,7 +61,11 @@ setup(
     packages=find_packages(exclude=['contrib', 'docs', 'tests', 'examples']),
     install_requires=['python-snappy', 'multitasking', 'toolz', 'partd',
                       'cloudpickle', 'distributed', 'pandas', 'numpy',
-                      'fastparquet', 'dask'],
+                      'fastparquet', 'fsspec', 'dask'],
+    extras_require={
+        # PyStoreClient (kedro pipelines, infinite time ranges)
+        'client': ['kedro', 'infinite'],
+    },
     entry_points={
         'console_scripts': [
             'sample=sample:main',
@@ -0,0 +1,57 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pystore
+from pystore import config, utils
+
+
+@pytest.fixture(params=["memory", "local"])
+def root(request, tmp_path):
+    """
+    A fresh datastore root on fsspec's in-memory filesystem or in a local tmp dir.
+    """
+    saved = (
+        config.DEFAULT_PATH,
+        config.STORAGE_OPTIONS,
+        config.PARTITION_SIZE,
+        config.METADATA_CACHE_TTL,
+    )
+    if request.param == "memory":
+        path = "memory://pystore-%s" % uuid.uuid4().hex
+    else:
+        path = str(tmp_path / "pystore")
+
+    pystore.set_path(path)
+    yield path
+
+    if request.param == "memory":
+        pystore.delete_stores()
+    (
+        config.DEFAULT_PATH,
+        config.STORAGE_OPTIONS,
+        config.PARTITION_SIZE,
+        config.METADATA_CACHE_TTL,
+    ) = saved
+    utils.clear_metadata_cache()
+
+
+@pytest.fixture
+def collection(root):
+    return pystore.PyStore("store").collection("v1")
+
+
+def make_frame(rows=100, freq="s", tz=None, start="2020-01-01", columns="ab"):
+    index = pd.date_range(start, periods=rows, freq=freq, tz=tz, name="ts")
+    data = np.arange(rows * len(columns), dtype=float).reshape(rows, len(columns))
+    return pd.DataFrame(data, index=index, columns=list(columns))
+
+
+def assert_frame_equal(left, right, **kwargs):
+    """
+    Compare frames ignoring the index frequency, which parquet doesn't keep.
+    """
+    kwargs.setdefault("check_freq", False)
+    pd.testing.assert_frame_equal(left, right, **kwargs)
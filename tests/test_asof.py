@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pystore
+from pystore import config, utils
+
+from .conftest import assert_frame_equal, make_frame
+
+
+@pytest.fixture
+def prices(collection):
+    """
+    An item split into 10 row groups.
+    """
+
+    def write(tz=None, freq="s"):
+        df = make_frame(rows=1000, freq=freq, tz=tz)
+        pystore.set_partition_size(df.memory_usage(deep=True).sum() / 10)
+        collection.write("prices", df)
+        return df, collection.item("prices")
+
+    return write
+
+
+def expected(df, timestamps):
+    return df.reindex(timestamps, method="pad")
+
+
+@pytest.mark.parametrize("tz", [None, "US/Eastern"])
+def test_asof_many_matches_pandas(prices, tz):
+    df, item = prices(tz)
+    timestamps = pd.date_range("2019-12-31 23:59:50", periods=400, freq="2700ms", tz=tz)
+
+    assert_frame_equal(
+        item.asof_many(timestamps), expected(df, timestamps), check_names=False
+    )
+
+
+def test_asof_decodes_only_the_needed_row_group(prices):
+    df, item = prices()
+    row = item.asof(df.index[555] + pd.Timedelta("500ms"))
+
+    pd.testing.assert_series_equal(row, df.iloc[555], check_names=False)
+    assert [group for group, _ in item._row_groups] == [5]
+
+
+def test_asof_before_first_row_is_nan(prices):
+    df, item = prices()
+    row = item.asof("2019-01-01")
+    assert row.isna().all()
+    assert list(row.index) == ["a", "b"]
+
+
+def test_asof_columns(prices):
+    df, item = prices()
+    rows = item.asof_many(df.index[[10, 900]], columns=["b"])
+    assert list(rows.columns) == ["b"]
+    assert list(rows["b"]) == list(df["b"].iloc[[10, 900]])
+
+
+def test_asof_naive_timestamps_use_item_timezone(prices):
+    df, item = prices("US/Eastern")
+    row = item.asof(pd.Timestamp("2020-01-01 00:00:10"))
+    pd.testing.assert_series_equal(row, df.iloc[10], check_names=False)
+
+
+def test_asof_keeps_nan_rows(collection):
+    df = make_frame()
+    df.iloc[5, 0] = np.nan
+    collection.write("prices", df)
+    assert np.isnan(collection.item("prices").asof(df.index[5])["a"])
+
+
+def test_asof_pickle_item(collection):
+    series = make_frame()["a"]
+    collection.write("series", series)
+    assert collection.item("series").asof(series.index[7]) == series.iloc[7]
+
+
+def test_sparse_index_is_epoch_ns(prices):
+    df, item = prices("US/Eastern")
+    offsets = item.metadata["_row_group_offsets"]
+    index = item.metadata["_index"]
+
+    assert index["tz"] == "US/Eastern"
+    assert index["row_group_starts"] == list(utils.epoch_ns(df.index[offsets]))
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_empty_item(collection, parallel):
+    df = make_frame(rows=0, tz="UTC")
+    collection.write("prices", df, parallel=parallel)
+
+    item = collection.item("prices")
+    assert "_index" not in item.metadata
+    rows = item.asof_many(pd.DatetimeIndex(["2020-01-01"], tz="UTC"))
+    assert rows.isna().all(axis=None)
+
+
+def test_long_lived_item_follows_overwrites(prices, collection):
+    df, item = prices()
+    assert item.asof(df.index[10])["a"] == df["a"].iloc[10]
+
+    other = -make_frame(rows=1000, start="2020-01-01 00:00:00.5")
+    collection.write("prices", other, overwrite=True)
+
+    # the sparse index is reloaded, and the cached row groups dropped
+    assert item.asof(other.index[900])["a"] == other["a"].iloc[900]
+    assert item.version == 2
+    assert item.asof(other.index[10])["a"] == other["a"].iloc[10]
+
+
+def test_stale_metadata_raises(prices, collection, monkeypatch):
+    df, item = prices()
+    collection.write("prices", df, overwrite=True)
+    # as if the writer died before replacing the metadata
+    metadata_path = utils.make_path(item._metadata_path, "metadata.json")
+    utils.write_metadata(metadata_path, item.metadata)
+
+    monkeypatch.setattr(config, "STALE_READ_TIMEOUT", 0.05)
+    with pytest.raises(utils.StaleVersionError):
+        collection.item("prices").data
@@ -0,0 +1,105 @@
+import json
+
+import fastparquet
+import numpy as np
+import pandas as pd
+import pytest
+
+from pystore import config, utils
+
+from .conftest import assert_frame_equal, make_frame
+
+
+def irregular(frame):
+    """
+    Drop every third row so the index is no longer regular.
+    """
+    return frame[np.arange(len(frame)) % 3 != 0]
+
+
+@pytest.mark.parametrize("tz", [None, "US/Eastern"])
+@pytest.mark.parametrize("kind", ["regular", "delta"])
+def test_round_trip(collection, tz, kind):
+    frame = make_frame(rows=300, tz=tz)
+    if kind == "delta":
+        frame = irregular(frame)
+    config.PARTITION_SIZE = frame.memory_usage(deep=True).sum() / 10
+    collection.write("prices", frame, encode_index=True)
+
+    item = collection.item("prices")
+    assert item.metadata["_index_encoding"] == kind
+    assert len(item.metadata["_row_group_offsets"]) > 5
+    pd.testing.assert_frame_equal(item.data, frame)
+
+    rows = [5, 150, -1]
+    assert_frame_equal(item.asof_many(frame.index[rows]), frame.iloc[rows])
+
+
+def test_encoding_stored_in_data_file(collection):
+    frame = make_frame(rows=50, freq="min")
+    collection.write("prices", frame, encode_index=True)
+    item = collection.item("prices")
+
+    with utils.open_file(item._data_path, "rb") as f:
+        footer = fastparquet.ParquetFile(f).key_value_metadata
+    encoding = json.loads(footer[utils.INDEX_ENCODING_KEY])
+    assert encoding["kind"] == "regular"
+    assert encoding["freq"] == "min"
+
+    # stale or missing item metadata can't change how the data decodes
+    metadata = dict(item.metadata)
+    metadata.pop("_index_encoding")
+    metadata_path = utils.make_path(item._metadata_path, "metadata.json")
+    utils.write_metadata(metadata_path, metadata)
+    pd.testing.assert_frame_equal(collection.item("prices").data, frame)
+
+
+def test_unit_and_freq(collection):
+    frame = make_frame(rows=40, freq="h")
+    if not hasattr(frame.index, "as_unit"):
+        pytest.skip("pandas without non-nanosecond support")
+    frame.index = frame.index.as_unit("us")
+    collection.write("prices", frame, encode_index=True)
+
+    data = collection.item("prices").data
+    assert data.index.dtype == frame.index.dtype
+    assert data.index.freq == frame.index.freq
+
+
+def test_parallel_write(collection):
+    frame = irregular(make_frame(rows=600, tz="UTC"))
+    config.PARTITION_SIZE = frame.memory_usage(deep=True).sum() / 10
+    collection.write("prices", frame, parallel=True, encode_index=True)
+
+    item = collection.item("prices")
+    pd.testing.assert_frame_equal(item.data, frame)
+    assert_frame_equal(item.tail(0).iloc[-7:], frame.iloc[-7:])
+
+
+def test_pickle(collection):
+    frame = irregular(make_frame(rows=30))
+    frame["label"] = "x"
+    collection.write("labels", frame, encode_index=True)
+
+    item = collection.item("labels")
+    assert item.file_type == "pickle"
+    data = item.data
+    assert not data.attrs
+    pd.testing.assert_frame_equal(data, frame)
+
+
+def test_append_keeps_encoding(collection):
+    frame = irregular(make_frame(rows=300))
+    collection.write("prices", frame.iloc[:100], encode_index=True)
+    collection.append("prices", frame.iloc[100:])
+
+    item = collection.item("prices")
+    assert item.metadata["_index_encoding"] == "delta"
+    assert_frame_equal(item.data, frame)
+    assert_frame_equal(item.tail(1), frame.iloc[100:])
+
+
+def test_encode_requires_fastparquet(collection):
+    collection.engine = "pyarrow"
+    with pytest.raises(ValueError):
+        collection.write("prices", make_frame(), encode_index=True)
@@ -0,0 +1,95 @@
+import fastparquet
+import numpy as np
+import pandas as pd
+import pytest
+
+import pystore
+from pystore import utils
+
+from .conftest import assert_frame_equal, make_frame
+
+
+def write_parallel(root, data, groups=8, **kwargs):
+    path = utils.make_path(root, "data.parquet")
+    offsets = utils.row_group_offsets(
+        data, partition_size=data.memory_usage(deep=True).sum() / groups
+    )
+    kwargs.setdefault("max_workers", 2)
+    utils.write_parquet_parallel(data, path, offsets, **kwargs)
+    return path, offsets
+
+
+def read(path, engine="fastparquet"):
+    with utils.open_file(path) as f:
+        return pd.read_parquet(f, engine=engine)
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_stitched_file_matches_serial_write(root, processes):
+    df = make_frame(rows=1000, tz="US/Eastern")
+    path, offsets = write_parallel(root, df, processes=processes)
+
+    fs, fs_path = utils.get_filesystem(path)
+    pf = fastparquet.ParquetFile(fs_path, fs=fs)
+    assert len(pf.row_groups) == len(offsets) == 8
+    assert [rg.num_rows for rg in pf.row_groups] == list(np.diff(offsets + [1000]))
+    assert_frame_equal(read(path), df)
+
+
+def test_stitched_file_row_groups(root):
+    df = make_frame(rows=1000)
+    path, offsets = write_parallel(root, df)
+    group = utils.read_parquet(path, row_groups=[5])
+    assert_frame_equal(group, df.iloc[offsets[5] : offsets[6]])
+
+
+def test_stitched_file_readable_by_pyarrow(root):
+    pytest.importorskip("pyarrow")
+    df = make_frame(rows=1000)
+    path, _ = write_parallel(root, df)
+    assert_frame_equal(read(path, engine="pyarrow"), df, check_index_type=False)
+
+
+def test_default_range_index(root):
+    df = make_frame(rows=1000).reset_index(drop=True)
+    path, _ = write_parallel(root, df)
+    assert_frame_equal(read(path), df)
+
+
+def test_custom_range_index_written_serially(root):
+    df = make_frame(rows=1000).reset_index(drop=True)
+    df.index = pd.RangeIndex(10, 1010)
+    path, _ = write_parallel(root, df)
+    assert_frame_equal(read(path), df)
+
+
+def test_failed_part_keeps_previous_file(root, monkeypatch):
+    df = make_frame(rows=1000)
+    path, _ = write_parallel(root, df)
+
+    encode = utils._encode_parquet
+
+    def failing(data, *args):
+        if data.index[0] != df.index[0]:
+            raise RuntimeError("encoding failed")
+        return encode(data, *args)
+
+    monkeypatch.setattr(utils, "_encode_parquet", failing)
+    with pytest.raises(RuntimeError):
+        write_parallel(root, df * 2)
+
+    assert_frame_equal(read(path), df)
+    fs, fs_path = utils.get_filesystem(root)
+    assert [p.rsplit("/", 1)[-1] for p in fs.ls(fs_path, detail=False)] == [
+        "data.parquet"
+    ]
+
+
+def test_collection_write_parallel(collection):
+    df = make_frame(rows=1000)
+    pystore.set_partition_size(df.memory_usage(deep=True).sum() / 4)
+    collection.write("prices", df, parallel=True)
+
+    item = collection.item("prices")
+    assert len(item.metadata["_row_group_offsets"]) == 4
+    assert_frame_equal(item.data, df)
@@ -0,0 +1,151 @@
+import time
+
+import pytest
+
+from pystore import utils
+
+from .conftest import assert_frame_equal, make_frame
+
+pytest.importorskip("kedro")
+pytest.importorskip("infinite")
+
+from pystore.client import PyStoreClient  # noqa: E402
+
+NAMES = list("abcde")
+
+
+@pytest.fixture
+def client(root):
+    client = PyStoreClient(root, "store", "v1")
+    for name in NAMES:
+        client.write(name, make_frame(rows=1000), always_overwrite=True)
+    with client:
+        yield client
+
+
+def settle(client, timeout=5):
+    """
+    Wait for the scheduler to stop and the scheduled loads to finish.
+    """
+    deadline = time.time() + timeout
+    while client._prefetch_scheduling and time.time() < deadline:
+        time.sleep(0.01)
+    for future in list(client._prefetched.values()):
+        future.exception(timeout=timeout)
+
+
+def test_prefetch_within_budget(client):
+    size = utils.path_size(client.collection.item("a")._data_path)
+    client.prefetch(NAMES + ["missing"], memory_budget=size * 1.5)
+    settle(client)
+    assert list(client._prefetched) == ["a"]
+    assert list(client._prefetch_queue) == NAMES[1:]
+
+    for name in NAMES:
+        item = client.read(name)
+        assert "data" in item.__dict__
+        assert_frame_equal(item.data, make_frame(rows=1000))
+        settle(client)
+    assert not client._prefetch_queue
+
+
+def test_deleted_item_is_dropped(client):
+    size = utils.path_size(client.collection.item("a")._data_path)
+    client.prefetch(NAMES, memory_budget=size * 1.5)
+    settle(client)
+    utils.remove_path(client.collection._item_path("c"))
+
+    client.read("a")
+    settle(client)
+    client.read("b")
+    settle(client)
+    assert list(client._prefetched) == ["d"]
+    assert list(client._prefetch_queue) == ["e"]
+
+
+def test_read_ahead_of_prefetch(client):
+    size = utils.path_size(client.collection.item("a")._data_path)
+    client.prefetch(NAMES, memory_budget=size * 1.5)
+    settle(client)
+
+    assert "data" not in client.read("c").__dict__
+    assert "c" not in client._prefetch_queue
+
+
+def test_scheduling_errors_never_reach_read(client, monkeypatch):
+    path_size = utils.path_size
+
+    def failing_path_size(path):
+        if "/b/" in path:
+            raise OSError("unavailable")
+        return path_size(path)
+
+    monkeypatch.setattr(utils, "path_size", failing_path_size)
+    client.prefetch(NAMES)
+    settle(client)
+    assert sorted(client._prefetched) == ["a", "c", "d", "e"]
+    assert_frame_equal(client.read("b").data, make_frame(rows=1000))
+
+
+def test_scheduling_io_does_not_hold_lock(client, monkeypatch):
+    path_size = utils.path_size
+    held = []
+
+    def checking_path_size(path):
+        acquired = client._prefetch_lock.acquire(timeout=1)
+        held.append(not acquired)
+        if acquired:
+            client._prefetch_lock.release()
+        return path_size(path)
+
+    monkeypatch.setattr(utils, "path_size", checking_path_size)
+    client.prefetch(NAMES)
+    settle(client)
+    assert held and not any(held)
+
+
+def test_write_drops_prefetched_copy(client):
+    client.prefetch(NAMES)
+    settle(client)
+    client.write("b", make_frame(rows=10), always_overwrite=True)
+    assert "b" not in client._prefetched
+    assert len(client.read("b").data) == 10
+
+
+def test_write_frees_budget_for_the_queue(client):
+    size = utils.path_size(client.collection.item("a")._data_path)
+    client.prefetch(NAMES, memory_budget=size * 1.5)
+    settle(client)
+    assert list(client._prefetched) == ["a"]
+
+    client.write("a", make_frame(rows=1000), always_overwrite=True)
+    settle(client)
+    assert list(client._prefetched) == ["b"]
+
+
+def test_max_workers_change_rebuilds_pool(client):
+    client.prefetch(NAMES, max_workers=2)
+    executor = client._prefetch_executor
+    client.prefetch(NAMES, max_workers=2)
+    assert client._prefetch_executor is executor
+
+    client.prefetch(NAMES, max_workers=3)
+    assert client._prefetch_executor is not executor
+    assert client._prefetch_executor._max_workers == 3
+    settle(client)
+    assert sorted(client._prefetched) == NAMES
+
+
+def test_close(client):
+    client.prefetch(NAMES)
+    executor = client._prefetch_executor
+    client.close()
+
+    assert executor._shutdown
+    assert client._prefetch_executor is None
+    assert not client._prefetched and not client._prefetch_queue
+    assert_frame_equal(client.read("a").data, make_frame(rows=1000))
+
+    client.prefetch(NAMES)
+    settle(client)
+    assert sorted(client._prefetched) == NAMES
@@ -0,0 +1,128 @@
+import json
+
+import pandas as pd
+import pytest
+
+import pystore
+from pystore import config, utils
+
+from .conftest import assert_frame_equal, make_frame
+
+
+def test_set_path_creates_root(root):
+    assert utils.path_exists(root)
+    assert pystore.list_stores() == []
+
+
+def test_collections(root):
+    store = pystore.PyStore("store")
+    store.collection("v1")
+    store.collection("v2")
+    assert sorted(store.list_collections()) == ["v1", "v2"]
+    assert pystore.list_stores() == ["store"]
+
+    store.delete_collection("v1")
+    assert store.list_collections() == ["v2"]
+
+
+def test_write_read_parquet(collection):
+    df = make_frame(tz="UTC")
+    collection.write("prices", df, metadata={"source": "test"})
+
+    item = collection.item("prices")
+    assert item.file_type == "parquet"
+    assert item.metadata["source"] == "test"
+    assert_frame_equal(item.data, df)
+
+
+def test_write_read_pickle(collection):
+    series = make_frame()["a"]
+    collection.write("series", series)
+
+    item = collection.item("series")
+    assert item.file_type == "pickle"
+    pd.testing.assert_series_equal(item.data, series)
+
+
+def test_write_existing_item_raises(collection):
+    collection.write("prices", make_frame())
+    with pytest.raises(ValueError):
+        collection.write("prices", make_frame())
+    collection.write("prices", make_frame(rows=5), overwrite=True)
+    assert len(collection.item("prices").data) == 5
+
+
+def test_file_type_change_removes_old_data(collection):
+    collection.write("prices", make_frame().assign(c="text"))
+    collection.write("prices", make_frame(rows=5), overwrite=True)
+
+    item = collection.item("prices")
+    assert item.file_type == "parquet"
+    assert len(item.data) == 5
+    assert not utils.path_exists(collection._item_path("prices/data.pickle"))
+
+
+def test_missing_item_raises(collection):
+    with pytest.raises(ValueError):
+        collection.item("missing")
+
+
+def test_list_items(collection):
+    collection.write("a", make_frame(), metadata={"kind": "x"})
+    collection.write("b", make_frame(), metadata={"kind": "y"})
+
+    assert collection.list_items() == {"a", "b"}
+    assert collection.list_items(kind="x") == {"a"}
+    assert collection.list_items_with_data() == {"a", "b"}
+
+
+def test_delete_store(root):
+    pystore.PyStore("store").collection("v1").write("a", make_frame())
+    pystore.delete_store("store")
+    assert pystore.list_stores() == []
+
+
+def test_read_parquet_row_groups(collection):
+    df = make_frame(rows=1000)
+    pystore.set_partition_size(df.memory_usage(deep=True).sum() / 10)
+    collection.write("prices", df)
+
+    item = collection.item("prices")
+    offsets = item.metadata["_row_group_offsets"]
+    assert len(offsets) == 10
+
+    group = utils.read_parquet(item._data_path, row_groups=[3])
+    assert_frame_equal(group, df.iloc[offsets[3] : offsets[4]])
+
+
+def test_metadata_cache_is_opt_in(collection):
+    collection.write("prices", make_frame(), metadata={"n": 1})
+    item_path = collection._item_path("prices")
+
+    def write_behind_our_back(n):
+        with utils.open_file(utils.make_path(item_path, "metadata.json"), "wb") as f:
+            f.write(json.dumps({"n": n, "file_type": "parquet"}).encode())
+
+    assert config.METADATA_CACHE_TTL == 0
+    write_behind_our_back(2)
+    assert utils.read_metadata(item_path)["n"] == 2
+
+    config.METADATA_CACHE_TTL = 60
+    assert utils.read_metadata(item_path)["n"] == 2
+    write_behind_our_back(3)
+    assert utils.read_metadata(item_path)["n"] == 2
+    assert utils.read_metadata(item_path, cache=False)["n"] == 3
+    assert collection.item("prices").metadata["n"] == 3
+
+
+@pytest.mark.parametrize(
+    "data, file_type",
+    [
+        (make_frame(), "parquet"),
+        (make_frame()["a"], "pickle"),
+        (make_frame().assign(c="text"), "pickle"),
+        (make_frame().set_index("a", append=True), "pickle"),
+    ],
+)
+def test_infer_file_type(data, file_type):
+    assert pystore.collection.Collection._infer_file_type_from_data(data) == file_type
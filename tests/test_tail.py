@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pystore import config, utils
+
+from .conftest import assert_frame_equal, make_frame
+
+
+@pytest.fixture
+def frame():
+    return make_frame(rows=300, tz="UTC")
+
+
+def test_versions_and_manifest(collection, frame):
+    collection.write("prices", frame.iloc[:100])
+    collection.append("prices", frame.iloc[100:200])
+    collection.append("prices", frame.iloc[200:])
+
+    item = collection.item("prices")
+    assert item.version == 3
+    assert item.metadata["_manifest"] == [[1, 0], [2, 100], [3, 200]]
+
+
+def test_tail(collection, frame):
+    collection.write("prices", frame.iloc[:100])
+    collection.append("prices", frame.iloc[100:200])
+    collection.append("prices", frame.iloc[200:])
+    item = collection.item("prices")
+
+    assert_frame_equal(item.tail(), frame)
+    assert_frame_equal(item.tail(0), frame)
+    assert_frame_equal(item.tail(1), frame.iloc[100:])
+    assert_frame_equal(item.tail(2), frame.iloc[200:])
+    assert item.tail(3).empty
+    assert list(item.tail(3).columns) == list(frame.columns)
+
+
+def test_tail_decodes_trailing_row_groups(collection, frame):
+    config.PARTITION_SIZE = frame.memory_usage(deep=True).sum() / 10
+    collection.write("prices", frame.iloc[:137])
+    collection.append("prices", frame.iloc[137:])
+
+    item = collection.item("prices")
+    assert len(item.metadata["_row_group_offsets"]) > 5
+    assert_frame_equal(item.tail(1), frame.iloc[137:])
+
+
+def test_overwrite_resets_manifest(collection, frame):
+    collection.write("prices", frame.iloc[:100])
+    collection.append("prices", frame.iloc[100:200])
+    collection.write("prices", frame.iloc[:10], overwrite=True)
+
+    item = collection.item("prices")
+    assert item.version == 3
+    assert item.metadata["_manifest"] == [[3, 0]]
+    assert_frame_equal(item.tail(1), frame.iloc[:10])
+
+
+def test_manifest_trimming_never_misses_rows(collection, frame, monkeypatch):
+    monkeypatch.setattr(config, "MANIFEST_LENGTH", 3)
+    collection.write("prices", frame.iloc[:10])
+    for row in range(10, 15):
+        collection.append("prices", frame.iloc[row : row + 1])
+
+    item = collection.item("prices")
+    assert item.metadata["_manifest"] == [[4, 0], [5, 13], [6, 14]]
+    assert_frame_equal(item.tail(5), frame.iloc[14:15])
+    assert_frame_equal(item.tail(2), frame.iloc[:15])
+
+
+def test_writes_leave_no_temporary_files(collection, frame):
+    collection.write("prices", frame.iloc[:100])
+    collection.append("prices", frame.iloc[100:])
+
+    fs, path = utils.get_filesystem(collection._item_path("prices"))
+    names = sorted(p.rsplit("/", 1)[-1] for p in fs.ls(path, detail=False))
+    assert names == ["data.parquet", "metadata.json"]
+
+
+def append_later(collection, data, delay=0.1):
+    def append():
+        time.sleep(delay)
+        collection.append("prices", data)
+
+    thread = threading.Thread(target=append)
+    thread.start()
+    return thread
+
+
+def test_subscribe(collection, frame):
+    collection.write("prices", frame.iloc[:100])
+    updates = collection.item("prices").subscribe(interval=0.01)
+
+    thread = append_later(collection, frame.iloc[100:150])
+    assert_frame_equal(next(updates), frame.iloc[100:150])
+    thread.join()
+
+
+def test_asubscribe(collection, frame):
+    collection.write("prices", frame.iloc[:100])
+
+    async def first_update():
+        updates = collection.item("prices").asubscribe(interval=0.01)
+        return await updates.__anext__()
+
+    thread = append_later(collection, frame.iloc[100:150])
+    assert_frame_equal(asyncio.run(first_update()), frame.iloc[100:150])
+    thread.join()
+
+
+def test_poll_retries_reads_that_overlap_a_write(collection, frame, monkeypatch):
+    collection.write("prices", frame.iloc[:100])
+    item = collection.item("prices")
+    collection.append("prices", frame.iloc[100:150])
+
+    read_parquet = utils.read_parquet
+    calls = []
+
+    def read_during_append(*args, **kwargs):
+        if not calls:
+            calls.append(1)
+            collection.append("prices", frame.iloc[150:200])
+            raise ValueError("partial file")
+        return read_parquet(*args, **kwargs)
+
+    monkeypatch.setattr(utils, "read_parquet", read_during_append)
+    rows, version = item._poll(item.version)
+
+    assert version == 3
+    assert_frame_equal(rows, frame.iloc[100:200])
+
+
+def test_poll_inside_the_write_window(collection, frame, monkeypatch):
+    config.PARTITION_SIZE = frame.memory_usage(deep=True).sum() / 30
+    collection.write("prices", frame.iloc[:50])
+    collection.append("prices", frame.iloc[50:55])
+    item = collection.item("prices")
+
+    write_metadata = utils.write_metadata
+    polls = []
+
+    def poll_before_metadata(path, metadata=None):
+        # the new data file is in place, its metadata isn't yet
+        thread = threading.Thread(target=lambda: polls.append(item._poll(1)))
+        thread.start()
+        time.sleep(0.1)
+        write_metadata(path, metadata)
+        thread.join()
+
+    monkeypatch.setattr(utils, "write_metadata", poll_before_metadata)
+    collection.append("prices", frame.iloc[55:75])
+
+    [(rows, version)] = polls
+    assert version == 3
+    assert_frame_equal(rows, frame.iloc[50:75])
+    assert item._poll(version) == (None, 3)
+
+
+def test_poll_without_metadata(collection, frame):
+    collection.write("prices", frame.iloc[:100])
+    item = collection.item("prices")
+    fs, path = utils.get_filesystem(collection._item_path("prices"))
+    fs.rm(path + "/metadata.json")
+
+    assert item._poll(item.version) == (None, item.version)